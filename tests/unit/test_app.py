@@ -1,6 +1,8 @@
 """tests of acme-cert-updater"""
 
+import os
 import unittest
+from unittest import mock
 
 from updater import app
 
@@ -37,5 +39,77 @@ class TestConfig(unittest.TestCase):
         config = app.Config({'cert_name': 'EXAMPLE.com'})
         self.assertEqual(config.cert_name, 'example.com')
 
+    def test_profile_threshold(self):
+        config = app.Config({})
+        with mock.patch.dict(os.environ, {'UPDATER_PROFILE_THRESHOLD': ''}):
+            self.assertEqual(config.profile_threshold, 0.0)
+        with mock.patch.dict(os.environ, {'UPDATER_PROFILE_THRESHOLD': '1.5'}):
+            self.assertEqual(config.profile_threshold, 1.5)
+        with mock.patch.dict(os.environ, {'UPDATER_PROFILE_THRESHOLD': 'abc'}):
+            with self.assertRaises(ValueError):
+                _ = config.profile_threshold
+        with mock.patch.dict(os.environ, {'UPDATER_PROFILE_THRESHOLD': '-1'}):
+            with self.assertRaises(ValueError):
+                _ = config.profile_threshold
+        with mock.patch.dict(os.environ, {'UPDATER_PROFILE_THRESHOLD': 'nan'}):
+            with self.assertRaises(ValueError):
+                _ = config.profile_threshold
+        with mock.patch.dict(os.environ, {'UPDATER_PROFILE_THRESHOLD': 'inf'}):
+            with self.assertRaises(ValueError):
+                _ = config.profile_threshold
+
+class TestProfiler(unittest.TestCase):
+    def test_fast_run(self):
+        with mock.patch.dict(os.environ, {'UPDATER_PROFILE_THRESHOLD': '3600'}):
+            with mock.patch.object(app, 's3') as s3:
+                with app.profiler(app.Config({'domains': 'example.com'})):
+                    pass
+                s3.Bucket.assert_not_called()
+
+    def test_slow_run(self):
+        env = {
+            'UPDATER_PROFILE_THRESHOLD': '0.000001',
+            'UPDATER_BUCKET_NAME': 'bucket',
+            'UPDATER_PREFIX': 'prefix',
+        }
+        with mock.patch.dict(os.environ, env):
+            with mock.patch.object(app, 's3') as s3:
+                with self.assertLogs(app.logger, level='WARNING') as logs:
+                    with self.assertRaises(RuntimeError):
+                        with app.profiler(app.Config({'domains': 'example.com'})):
+                            sum(range(10000))
+                            raise RuntimeError('renewal failed')
+                s3.Bucket.assert_called_with('bucket')
+                bucket = s3.Bucket.return_value
+                key = bucket.upload_file.call_args[0][1]
+                self.assertTrue(key.startswith('prefix/profiles/example.com/'))
+                self.assertTrue(key.endswith('/cprofile.pstats'))
+                key = bucket.put_object.call_args[1]['Key']
+                self.assertTrue(key.endswith('/tracemalloc.txt'))
+                self.assertEqual(len(logs.output), 1)
+                self.assertTrue(logs.output[0].startswith('WARNING:'))
+                self.assertIn('slow run:', logs.output[0])
+                self.assertIn('profile=s3://bucket/prefix/profiles/example.com/', logs.output[0])
+                self.assertFalse(app.tracemalloc.is_tracing())
+
+    def test_invalid_threshold(self):
+        with mock.patch.dict(os.environ, {'UPDATER_PROFILE_THRESHOLD': 'abc'}):
+            with mock.patch.object(app, 'handle_event') as handle_event:
+                with self.assertLogs(app.logger, level='ERROR') as logs:
+                    self.assertEqual(app.lambda_handler({'domains': 'example.com'}, None), {})
+                handle_event.assert_called_once()
+                self.assertIn('profiling is disabled', logs.output[0])
+
+    def test_setup_failure(self):
+        with mock.patch.dict(os.environ, {'UPDATER_PROFILE_THRESHOLD': '1'}):
+            with mock.patch.object(app.cProfile, 'Profile') as profile:
+                profile.return_value.enable.side_effect = ValueError('Another profiling tool is already active')
+                with mock.patch.object(app, 'handle_event') as handle_event:
+                    with self.assertLogs(app.logger, level='ERROR') as logs:
+                        self.assertEqual(app.lambda_handler({'domains': 'example.com'}, None), {})
+                    handle_event.assert_called_once()
+                    self.assertIn('profiling is disabled', logs.output[0])
+                    self.assertFalse(app.tracemalloc.is_tracing())
+
 if __name__ == '__main__':
     unittest.main()
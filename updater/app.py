@@ -7,10 +7,16 @@ update the certificate using ACME and Route 53
 import os
 import os.path
 import pathlib
+import cProfile
+import io
 import json
+import math
+import pstats
 import string
 import tempfile
+import time
 import traceback
+import tracemalloc
 import urllib.request
 from datetime import datetime
 from typing import Dict, Union, List
@@ -118,6 +124,20 @@ class Config:
         """The Amazon SNS topic Amazon Resource Name (ARN) to which the updater reports events."""
         return os.environ.get('UPDATER_NOTIFICATION', '')
 
+    @property
+    def profile_threshold(self) -> float:
+        """
+        Duration in seconds. If a run takes longer than this, its profile is uploaded to S3.
+        0 disables profiling.
+        """
+        threshold = os.environ.get('UPDATER_PROFILE_THRESHOLD', '')
+        if threshold == '':
+            return 0.0
+        value = float(threshold)
+        if not math.isfinite(value) or value < 0:
+            raise ValueError("invalid profile threshold " + threshold)
+        return value
+
 def cfn_response(url: str, body: object) -> None:
     """cfn_response sends the response to CloudFormation"""
     data = json.dumps(body).encode()
@@ -225,6 +245,95 @@ class mock_atexit:
         self._patch.stop()
         self.atexit_call()
 
+class profiler:
+    """
+    profile the block with cProfile and tracemalloc,
+    and upload the result to Amazon S3 if it takes longer than config.profile_threshold.
+    """
+
+    def __init__(self, config):
+        self._config = config
+        try:
+            self._threshold = config.profile_threshold
+        except ValueError:
+            # a broken threshold must not stop the renewal. disable profiling instead.
+            logger.error('profiling is disabled: ' + traceback.format_exc())
+            self._threshold = 0.0
+        self._profile = None
+        self._tracing = False
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        if self._threshold <= 0:
+            return self
+        try:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracing = True
+            tracemalloc.reset_peak()
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        except: # pylint: disable=bare-except
+            # profiling must not block the renewal. disable profiling instead.
+            logger.error('profiling is disabled: ' + traceback.format_exc())
+            self._profile = None
+            if self._tracing:
+                tracemalloc.stop()
+                self._tracing = False
+        return self
+
+    def __exit__(self, ex_type, ex_value, trace):
+        if self._profile is None:
+            return
+        self._profile.disable()
+        elapsed = time.perf_counter() - self._start
+        try:
+            _, peak = tracemalloc.get_traced_memory()
+            if elapsed < self._threshold:
+                return
+            snapshot = tracemalloc.take_snapshot()
+            self.upload(elapsed, peak, snapshot)
+        except: # pylint: disable=bare-except
+            # profiling must not hide the result of the renewal.
+            logger.error('failed to upload the profile: ' + traceback.format_exc())
+        finally:
+            if self._tracing:
+                tracemalloc.stop()
+
+    def upload(self, elapsed: float, peak: int, snapshot: tracemalloc.Snapshot) -> None:
+        """upload the profile and the memory statistics to Amazon S3"""
+        config = self._config
+        now = datetime.utcnow().isoformat()
+        bucket = s3.Bucket(config.bucket_name)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            stats_path = os.path.join(tmp, 'cprofile.pstats')
+            self._profile.dump_stats(stats_path)
+            stats_key = build_key(config.prefix, 'profiles', config.cert_name, now, 'cprofile.pstats')
+            bucket.upload_file(stats_path, stats_key)
+
+        memory = io.StringIO()
+        memory.write(f'elapsed: {elapsed:.3f} s\n')
+        memory.write(f'peak memory: {peak} bytes\n\n')
+        for stat in snapshot.statistics('lineno')[:30]:
+            memory.write(str(stat) + '\n')
+        memory_key = build_key(config.prefix, 'profiles', config.cert_name, now, 'tracemalloc.txt')
+        bucket.put_object(
+            Body=memory.getvalue(),
+            Key=memory_key,
+            ContentType='text/plain',
+        )
+
+        stats = pstats.Stats(self._profile, stream=io.StringIO())
+        stats.sort_stats('tottime')
+        hot = [pstats.func_std_string(func) for func in stats.fcn_list[:3]]
+        logger.warning(
+            f'slow run: elapsed={elapsed:.3f}s threshold={self._threshold:.3f}s '
+            f'peak_memory={peak} bytes profile=s3://{config.bucket_name}/{stats_key} '
+            f'memory=s3://{config.bucket_name}/{memory_key} top={hot}'
+        )
+
 def certbot_main(args: List[str]) -> None:
     """
     certbot_main is a wrapper of certbot.main.main.
@@ -469,17 +578,19 @@ def lambda_handler(event: object, context: object): # pylint: disable=unused-arg
 
     if "RequestType" in event:
         # it looks like a request from AWS Lambda-backed custom resources
-        handle_cfn_custom_resource(event)
+        config = Config(event['ResourceProperties'])
+        with profiler(config):
+            handle_cfn_custom_resource(event, config)
     else:
         config = Config(event)
-        handle_event(config)
+        with profiler(config):
+            handle_event(config)
 
     return {}
 
-def handle_cfn_custom_resource(event: object) -> None:
+def handle_cfn_custom_resource(event: object, config: Config) -> None:
     """handles requests from AWS Lambda-backed custom resources"""
     properties = event['ResourceProperties']
-    config = Config(properties)
     resourceId = properties['domains']
     ret = {
         'Status': 'SUCCESS',